@@ -1,10 +1,25 @@
+"""
+Usage: convert_to_dawg.py input.jsonl [frequencies.tsv]
+
+Builds dict.dawg, lemma_dict.mpack and label_dict.mpack in the current dir.
+
+frequencies.tsv has "lemma<TAB>frequency" lines and gives the prior weight of
+every term->lemma mapping (a "frequency" field of the record takes
+precedence). Without frequencies all lemmas weigh 1.0 (0.5 for typos), so
+the beam mode of Matcher has nothing to rank variants by and keeps
+arbitrary ones: pass frequencies if you use beam_width/beam_combinations.
+Pass the same file to bin/import.py, so Elasticsearch results get the same
+weights.
+"""
 import sys
 import msgpack
 import dawg
 import os.path
 from ujson import loads
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-from name_utils import normalize_charset
+from name_utils import (
+    normalize_charset, transliteration_variants, load_frequencies)
+from settings import TYPO_WEIGHT
 
 
 def add_to_dct(x, dct):
@@ -25,6 +40,20 @@ def get_lemma_type(rec):
     }[labels[0]]
 
 
+def get_prior(rec, frequencies):
+    """
+    Prior weight of the term->lemma mapping.
+
+    Frequency of the lemma comes from the record's "frequency" field or from
+    the frequencies file, otherwise all lemmas are equally likely. Typos are
+    discounted.
+    """
+    labels = set(rec["lemma_labels"]) - {"lemma"}
+    freq = rec.get("frequency", frequencies.get(rec["lemma"], 1.0))
+
+    return freq * (TYPO_WEIGHT if labels.pop().endswith("-typo") else 1.0)
+
+
 if __name__ == '__main__':
     if len(sys.argv) < 2:
         raise Exception("Input file argument is not specified")
@@ -33,6 +62,13 @@ if __name__ == '__main__':
     if not os.path.exists(input_fname):
         raise Exception("Input file doesn't exist")
 
+    frequencies = {}
+    if len(sys.argv) > 2:
+        frequencies = load_frequencies(sys.argv[2])
+    else:
+        print("No frequencies file given, all lemmas get the same prior "
+              "weight (Matcher beam mode won't be meaningful)")
+
     lemmas = {}
     labels = {}
     dictionary = []
@@ -41,9 +77,11 @@ if __name__ == '__main__':
         for i, line in enumerate(input_fp):
             rec = loads(line)
             term = normalize_charset(rec["term"])
+            rec["weight"] = get_prior(rec, frequencies)
             rec["lemma"] = add_to_dct(rec["lemma"], lemmas)
 
             lemma_type = get_lemma_type(rec)
+            rec.pop("frequency", None)
             del rec["properties"]
             del rec["lemma_labels"]
             del rec["term"]
@@ -52,14 +90,18 @@ if __name__ == '__main__':
                     lambda x: add_to_dct(x, labels),
                     rec["labels"]))
 
-            dictionary.append(
-                ("%s|%s" % (term, lemma_type), msgpack.packb(rec))
-            )
+            # Storing also common latin transliterations of the term, so
+            # latin input can be resolved with an exact lookup
+            keys = {term} | transliteration_variants(term)
 
             # Storing also initial letters for names and patronymics
             if lemma_type in "fp":
+                keys |= set(x[0] for x in keys)
+
+            payload = msgpack.packb(rec)
+            for key in sorted(keys):
                 dictionary.append(
-                    ("%s|%s" % (term[0], lemma_type), msgpack.packb(rec))
+                    ("%s|%s" % (key, lemma_type), payload)
                 )
 
             if i and i % 100000 == 0:
@@ -0,0 +1,156 @@
+import sys
+import json
+import random
+import os.path
+from time import sleep
+from threading import Thread
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from name_utils import normalize_charset
+
+
+def find_term(clause):
+    """
+    Find the value of {"term": {"term": ...}} filter in the search body.
+    """
+    if isinstance(clause, dict):
+        term = clause.get("term")
+        if isinstance(term, dict) and "term" in term:
+            value = term["term"]
+            return value["value"] if isinstance(value, dict) else value
+
+        clause = list(clause.values())
+
+    if isinstance(clause, list):
+        for x in clause:
+            value = find_term(x)
+            if value is not None:
+                return value
+
+    return None
+
+
+class MSearchStub(ThreadingHTTPServer):
+    """
+    In-process stand-in for the Elasticsearch _msearch endpoint.
+
+    Answers term filters issued by NameVariant.batch_request from an in-memory
+    dictionary of documents, sleeping `latency` seconds (plus random jitter up
+    to `jitter` seconds) on each request to mimic a real cluster.
+    """
+    daemon_threads = True
+
+    def __init__(self, docs, host="localhost", port=0, latency=0.0,
+                 jitter=0.0, doc_type="name_variant"):
+        super().__init__((host, port), MSearchHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.doc_type = doc_type
+        self.docs = {}
+
+        for i, doc in enumerate(docs):
+            doc = dict(doc, term=normalize_charset(doc["term"]))
+            self.docs.setdefault(doc["term"], []).append((str(i), doc))
+
+    @property
+    def url(self):
+        return "%s:%s" % self.server_address[:2]
+
+    def start(self):
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def search(self, index, body):
+        hits = [
+            {
+                "_index": index,
+                "_type": self.doc_type,
+                "_id": id_,
+                "_score": 1.0,
+                "_source": doc
+            }
+            for id_, doc in self.docs.get(find_term(body), [])
+        ]
+
+        return {
+            "took": 1,
+            "timed_out": False,
+            "_shards": {"total": 1, "successful": 1, "failed": 0},
+            "hits": {
+                "total": len(hits),
+                "max_score": 1.0 if hits else None,
+                "hits": hits
+            }
+        }
+
+
+class MSearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        # Elasticsearch client sends _msearch as GET with body
+        if self.path.split("?")[0].endswith("_msearch"):
+            self.do_POST()
+        else:
+            self.reply(200, {"version": {"number": "2.4.0"}, "tagline": "stub"})
+
+    def do_POST(self):
+        path = self.path.split("?")[0].strip("/").split("/")
+        length = int(self.headers.get("Content-Length", 0))
+        lines = [
+            json.loads(x)
+            for x in self.rfile.read(length).decode("utf-8").splitlines()
+            if x.strip()
+        ]
+
+        if path[-1] != "_msearch":
+            self.reply(404, {"error": "only _msearch is supported", "status": 404})
+            return
+
+        default_index = path[0] if len(path) > 1 else None
+        responses = [
+            self.server.search(header.get("index", default_index), body)
+            for header, body in zip(lines[::2], lines[1::2])
+        ]
+
+        sleep(self.server.latency + random.uniform(0, self.server.jitter))
+        self.reply(200, {"responses": responses})
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        raise Exception("Input file argument is not specified")
+
+    input_fname = sys.argv[1]
+    if not os.path.exists(input_fname):
+        raise Exception("Input file doesn't exist")
+
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 9200
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+
+    with open(input_fname, encoding="utf-8") as input_fp:
+        stub = MSearchStub(map(json.loads, input_fp), port=port,
+                           latency=latency)
+
+    print("Serving _msearch stub on %s" % stub.url)
+    stub.serve_forever()
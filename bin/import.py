@@ -6,7 +6,7 @@ from elasticsearch.helpers import streaming_bulk
 from elasticsearch_dsl.connections import connections
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from models.names import NameVariant
-from name_utils import normalize_charset
+from name_utils import normalize_charset, load_frequencies
 from settings import ELASTICSEARCH_CONNECTIONS
 
 
@@ -26,6 +26,13 @@ def normalize_alphabet(rec):
     rec["term"] = normalize_charset(rec["term"])
     return rec
 
+
+def add_frequency(rec, frequencies):
+    # Same lemma frequency convert_to_dawg.py uses for the prior weight
+    if "frequency" not in rec and rec["lemma"] in frequencies:
+        rec["frequency"] = frequencies[rec["lemma"]]
+    return rec
+
 if __name__ == '__main__':
     if len(sys.argv) < 2:
         raise Exception("Input file argument is not specified")
@@ -34,6 +41,10 @@ if __name__ == '__main__':
     if not os.path.exists(input_fname):
         raise Exception("Input file doesn't exist")
 
+    frequencies = {}
+    if len(sys.argv) > 2:
+        frequencies = load_frequencies(sys.argv[2])
+
     connections.configure(**ELASTICSEARCH_CONNECTIONS)
     Index(NameVariant._doc_type.index).delete(ignore=404)
     NameVariant.init()
@@ -42,7 +53,7 @@ if __name__ == '__main__':
     total_lines = 0
     with open(input_fname, encoding="utf-8") as input_fp:
         for i, line in enumerate(input_fp):
-            accum.append(loads(line))
+            accum.append(add_frequency(loads(line), frequencies))
             if len(accum) >= 10000:
                 total_lines += len(accum)
                 bulk_load(map(normalize_alphabet, accum))
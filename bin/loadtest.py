@@ -0,0 +1,163 @@
+import sys
+import json
+import os.path
+import argparse
+from time import perf_counter, sleep
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from name_utils import parse_fullname
+from resolver import freeze_long_lived
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+
+    pos = int(round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[pos]
+
+
+def configure_es(args):
+    from elasticsearch_dsl.connections import connections
+    from settings import ELASTICSEARCH_CONNECTIONS
+
+    conf = dict(ELASTICSEARCH_CONNECTIONS["default"])
+    conf["maxsize"] = args.concurrency
+    if args.es_host:
+        conf["hosts"] = args.es_host
+
+    connections.configure(default=conf)
+
+
+def get_backend(name, args):
+    if name == "dawg":
+        from hasher import batch_request
+        return batch_request
+
+    if name == "es":
+        from models.names import NameVariant
+
+        configure_es(args)
+        return NameVariant.batch_request
+
+    if name == "tiered":
+        from resolver import TieredResolver
+
+        configure_es(args)
+        return TieredResolver().batch_request
+
+    raise Exception("Unknown backend %s" % name)
+
+
+def run(batch_request, batches, concurrency, rate):
+    """
+    Replay batches against the backend and collect per-batch latencies.
+
+    With a rate limit latency is measured from the moment the batch was
+    scheduled to be sent, so time spent waiting for a free worker counts too.
+    """
+    started = perf_counter()
+
+    def call(i, batch):
+        scheduled = started + i / rate if rate else None
+        if scheduled is not None:
+            sleep(max(0, scheduled - perf_counter()))
+
+        call_started = perf_counter()
+        try:
+            batch_request(batch)
+            error = False
+        except Exception:
+            error = True
+
+        return perf_counter() - (scheduled or call_started), error
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, *zip(*enumerate(batches))))
+
+    return results, perf_counter() - started
+
+
+def report(backend, batches, results, elapsed):
+    latencies = sorted(latency for latency, error in results if not error)
+    errors = sum(error for _, error in results)
+    names = sum(map(len, batches))
+
+    return {
+        "backend": backend,
+        "batches": len(batches),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "batches_per_second": round(len(batches) / elapsed, 1),
+        "names_per_second": round(names / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Replay a corpus of names against lookup backends and "
+                    "report latency percentiles and throughput")
+    parser.add_argument("corpus", help="Text file with one full name per line")
+    parser.add_argument("--backend", action="append",
+                        choices=["dawg", "es", "tiered"],
+                        help="Backend to test, can be repeated (default: dawg)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Batches per second, 0 means as fast as possible")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Names per batch_request call")
+    parser.add_argument("--requests", type=int, default=0,
+                        help="Total batches to send, corpus is cycled if needed")
+    parser.add_argument("--es-host", help="Elasticsearch host to use")
+    parser.add_argument("--es-stub",
+                        help="Serve ES from an in-process stub loaded from this "
+                             "jsonl file (same format as bin/import.py input)")
+    parser.add_argument("--es-latency", type=float, default=0.0,
+                        help="Stub latency per _msearch request, seconds")
+    parser.add_argument("--es-jitter", type=float, default=0.0,
+                        help="Random extra stub latency up to this, seconds")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.corpus):
+        raise Exception("Corpus file doesn't exist")
+
+    with open(args.corpus, encoding="utf-8") as corpus_fp:
+        names = [parse_fullname(x) for x in corpus_fp if x.strip()]
+
+    batches = [
+        names[i:i + args.batch_size]
+        for i in range(0, len(names), args.batch_size)
+    ]
+    if args.requests:
+        batches = [batches[i % len(batches)] for i in range(args.requests)]
+
+    stub = None
+    if args.es_stub:
+        from es_stub import MSearchStub
+
+        with open(args.es_stub, encoding="utf-8") as stub_fp:
+            stub = MSearchStub(map(json.loads, stub_fp),
+                               latency=args.es_latency,
+                               jitter=args.es_jitter).start()
+        args.es_host = stub.url
+
+    try:
+        backends = [
+            (backend, get_backend(backend, args))
+            for backend in args.backend or ["dawg"]
+        ]
+
+        # Everything long-lived is loaded by now
+        freeze_long_lived()
+
+        for backend, batch_request in backends:
+            results, elapsed = run(batch_request, batches,
+                                   args.concurrency, args.rate)
+            print(json.dumps(report(backend, batches, results, elapsed)))
+    finally:
+        if stub is not None:
+            stub.stop()
@@ -0,0 +1,37 @@
+from time import perf_counter
+from name_utils import parse_fullname
+
+
+def explain(matcher, person_name, resolver=None):
+    """
+    Run the full matching pipeline for a single name and report its cost.
+
+    Takes a Matcher instance, a raw name and an optional resolver (a function
+    that works like hasher.batch_request, which is used by default).
+    Returns normalized tokens, variants found per token, matcher stats
+    (see Matcher.explain) and seconds spent on each stage.
+    """
+    if resolver is None:
+        from hasher import batch_request as resolver
+
+    timings = {}
+
+    started = perf_counter()
+    tokens = parse_fullname(person_name)
+    timings["parse"] = perf_counter() - started
+
+    started = perf_counter()
+    lemmas = resolver([tokens])[0]
+    timings["resolve"] = perf_counter() - started
+
+    started = perf_counter()
+    stats = matcher.explain(lemmas)
+    timings["match"] = perf_counter() - started
+
+    return {
+        "tokens": tokens,
+        "variants": [len(x) for x in lemmas],
+        "lemmas": lemmas,
+        "matcher": stats,
+        "timings": timings
+    }
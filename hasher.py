@@ -1,9 +1,9 @@
 import os.path
-import gc
 from hashlib import sha1
 from itertools import chain
 import msgpack
 from dawg import BytesDAWG
+from matcher import dedupe_variants
 
 
 NAMES_DAWG = BytesDAWG().load(
@@ -25,36 +25,36 @@ def batch_request(names):
                 msgpack.loads(payload, use_list=False)
             )
 
-        hashes = chain(
+        hashes = tuple(chain(
             *map(
                 lambda key: map(lambda payload: unpack(key, payload),
                                 NAMES_DAWG.__getitem__(key)),
                 frozenset(NAMES_DAWG.iterkeys(prefix + "|"))
             )
-        )
+        ))
 
         if hashes:
-            return tuple(map(dict, set(
-                (
-                    ("term", term),
-                    ("label", lemma_type),
-                    ("lemma", x[b"lemma"])
-                )
+            return dedupe_variants(
+                {
+                    "term": term,
+                    "label": lemma_type,
+                    "lemma": x[b"lemma"],
+                    "weight": x.get(b"weight", 1.0)
+                }
                 for (term, lemma_type), x in hashes
-            )))
+            )
         else:
             return (({
                 "lemma": sha1((prefix + "thisissalt").encode('utf-8')).hexdigest(),
                 "label": "u",  # U is for unknown
+                "weight": 1.0,
                 "term": prefix
             }, ))
 
     results = []
-    gc.disable()
     for name in names:
         results.append(
             tuple(map(lambda x: resolve_chunk(x), name))
         )
-    gc.enable()
 
     return results
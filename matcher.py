@@ -1,6 +1,209 @@
-from itertools import product, islice
+import os
+import pickle
+from zlib import crc32
+from time import perf_counter
+from tempfile import TemporaryDirectory
+from threading import Event
+from multiprocessing import Pool
+from heapq import heappush, heappop
+from itertools import product
 from operator import itemgetter
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+
+
+# complete is False when the call was cut short, reason tells why:
+# "combinations", "deadline", "cancelled" (budget), "beam" (beam_combinations
+# hit) or "capped" (max_combinations hit)
+MatchResult = namedtuple("MatchResult", ["ids", "complete", "reason"])
+IndexResult = namedtuple("IndexResult", ["keys", "complete", "reason"])
+
+
+class Budget(object):
+    """
+    Limit on the work a single add_example or match call can do.
+
+    timeout is in seconds and starts counting when the budget is created,
+    max_combinations limits the number of combinations generated. Call
+    cancel() from another thread to stop the call cooperatively.
+    """
+    # How often (in combinations) to look at the clock
+    check_every = 1024
+
+    def __init__(self, timeout=None, max_combinations=None):
+        self.deadline = None
+        if timeout is not None:
+            self.deadline = perf_counter() + timeout
+
+        self.max_combinations = max_combinations
+        self.spent = 0
+        self.reason = None
+        self.cancelled = Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def stop(self, reason):
+        if self.reason is None:
+            self.reason = reason
+
+    @property
+    def complete(self):
+        return self.reason is None
+
+    def spend(self):
+        """
+        Account for one more combination, return False if it's over budget.
+        """
+        if self.reason is not None:
+            return False
+
+        if self.cancelled.is_set():
+            self.stop("cancelled")
+        elif (self.max_combinations is not None and
+                self.spent >= self.max_combinations):
+            self.stop("combinations")
+        elif (self.deadline is not None and
+                self.spent % self.check_every == 0 and
+                perf_counter() > self.deadline):
+            self.stop("deadline")
+        else:
+            self.spent += 1
+
+        return self.reason is None
+
+
+def weight(lemma_variant):
+    return lemma_variant.get("weight", 1.0)
+
+
+def dedupe_variants(variants):
+    """
+    Keep one variant per (term, label, lemma), the heaviest one.
+
+    Several records (e.g. word form and typo) can map the term to the same
+    lemma, all resolvers should return it once.
+
+    >>> res = dedupe_variants([
+    ...     {"term": "Олег", "label": "f", "lemma": 1, "weight": 0.5},
+    ...     {"term": "Олег", "label": "f", "lemma": 1, "weight": 1.0},
+    ...     {"term": "Олег", "label": "l", "lemma": 1, "weight": 0.5}])
+    >>> [(x["label"], x["weight"]) for x in res]
+    [('f', 1.0), ('l', 0.5)]
+    """
+    res = {}
+    for variant in variants:
+        key = (variant["term"], variant["label"], variant["lemma"])
+        if key not in res or weight(variant) > weight(res[key]):
+            res[key] = variant
+
+    return tuple(res.values())
+
+
+def best_products(lemmas):
+    """
+    Generate the cartesian product of variants in order of decreasing score.
+
+    Score of a combination is a product of variant probabilities, where
+    probability is a weight of the variant normalized within its token.
+
+    >>> a, b = {"lemma": "a", "weight": 1}, {"lemma": "b", "weight": 3}
+    >>> c, d = {"lemma": "c", "weight": 2}, {"lemma": "d"}
+    >>> res = best_products([[a, b], [c, d]])
+    >>> [tuple(x["lemma"] for x in combination) for combination in res]
+    [('b', 'c'), ('b', 'd'), ('a', 'c'), ('a', 'd')]
+    >>> list(best_products([[a, b], []]))
+    []
+    >>> list(best_products([]))
+    [()]
+    """
+    lemmas = [sorted(x, key=weight, reverse=True) for x in lemmas]
+    if not all(lemmas):
+        return
+
+    probs = []
+    for variants in lemmas:
+        total = sum(map(weight, variants)) or 1.0
+        probs.append([weight(x) / total for x in variants])
+
+    def score(pos):
+        res = 1.0
+        for p, i in zip(probs, pos):
+            res *= p[i]
+        return res
+
+    start = (0,) * len(lemmas)
+    heap = [(-score(start), start)]
+    seen = {start}
+
+    while heap:
+        _, pos = heappop(heap)
+        yield tuple(x[i] for x, i in zip(lemmas, pos))
+
+        for j in range(len(pos)):
+            if pos[j] + 1 < len(lemmas[j]):
+                nxt = pos[:j] + (pos[j] + 1,) + pos[j + 1:]
+                if nxt not in seen:
+                    seen.add(nxt)
+                    heappush(heap, (-score(nxt), nxt))
+
+
+def partition(hashes, parts):
+    """
+    Assign index key to one of the parts.
+
+    Unlike hash() it gives the same answer in every process, even for string
+    lemmas.
+    """
+    return sum(
+        x if isinstance(x, int) else crc32(str(x).encode("utf-8"))
+        for x in hashes
+    ) % parts
+
+
+def build_partial(args):
+    """
+    Index a chunk of examples and dump its seed split into parts.
+
+    Module level function, so it can be used by multiprocessing workers.
+    """
+    config, max_combinations, chunk_no, chunk, parts, tmpdir = args
+    matcher = Matcher(**config)
+    matcher.max_combinations = max_combinations
+
+    truncated = matcher.add_examples(chunk)
+
+    buckets = [{} for _ in range(parts)]
+    for hashes, ids in matcher.seed.items():
+        buckets[partition(hashes, parts)][hashes] = ids
+
+    for part, bucket in enumerate(buckets):
+        fname = os.path.join(tmpdir, "%s-%s" % (chunk_no, part))
+        with open(fname, "wb") as fp:
+            pickle.dump(bucket, fp, pickle.HIGHEST_PROTOCOL)
+
+    return truncated
+
+
+def merge_partials(args):
+    """
+    Merge one part of the seed from all chunks, in the order of chunks.
+    """
+    chunks, part, tmpdir = args
+    seed = {}
+
+    for chunk_no in range(chunks):
+        fname = os.path.join(tmpdir, "%s-%s" % (chunk_no, part))
+        with open(fname, "rb") as fp:
+            bucket = pickle.load(fp)
+        os.unlink(fname)
+
+        for hashes, ids in bucket.items():
+            if hashes in seed:
+                seed[hashes].extend(ids)
+            else:
+                seed[hashes] = ids
+
+    return seed
 
 
 class Matcher(object):
@@ -34,8 +237,23 @@ class Matcher(object):
     # Firstname Firstname Firstname Lastname Lastname ; Mega rare
     # Firstname Firstname Lastname Lastname Lastname  ; Mega rare
 
-    def __init__(self, examples=None):
+    max_combinations = 10000000
+    # How many distinct combinations explain remembers to count repeats
+    explain_tracked = 100000
+
+    def __init__(self, examples=None, beam_width=None, beam_combinations=None):
+        """
+        Beam mode trades recall for bounded cost: when beam_width is set only
+        that many most probable variants of each token are kept, when
+        beam_combinations is set only that many most probable combinations
+        are generated. Probabilities come from variant weights, so beam mode
+        only makes sense with a DAWG built with lemma frequencies (see
+        bin/convert_to_dawg.py), otherwise variants of equal weight are kept
+        in whatever order the resolver returned them.
+        """
         self.seed = defaultdict(list)
+        self.beam_width = beam_width
+        self.beam_combinations = beam_combinations
 
         if examples is not None:
             self.add_examples(examples)
@@ -73,26 +291,199 @@ class Matcher(object):
 
         return by_type
 
-    def filter_and_embellish(self, lemmas):
+    def filter_and_embellish(self, lemmas, stats=None, budget=None):
         # TODO: filtering, processing of unknown entries,
         # double names/lastnames
 
-        # islice(1000) is our safety valve against combinatoric explosion
-        for hashes in islice(product(*lemmas), 10000000):
+        limit = self.max_combinations
+
+        if self.beam_width is not None:
+            lemmas = [
+                sorted(x, key=weight, reverse=True)[:self.beam_width]
+                for x in lemmas
+            ]
+
+        reason = "capped"
+        if self.beam_combinations is not None:
+            combinations = best_products(lemmas)
+            if self.beam_combinations < limit:
+                limit, reason = self.beam_combinations, "beam"
+        else:
+            combinations = product(*lemmas)
+
+        # limit is our safety valve against combinatoric explosion
+        for i, hashes in enumerate(combinations, 1):
+            if i > limit:
+                # There are more combinations than the limit allows
+                if stats is not None:
+                    stats["reason"] = reason
+                break
+
+            if budget is not None and not budget.spend():
+                if stats is not None:
+                    stats["reason"] = budget.reason
+                break
+
             # Very naive generation of variants for now
             yield frozenset(x["lemma"] for x in hashes)
 
-    def add_example(self, id_, example):
-        for hashes in self.filter_and_embellish(example):
+    def add_example(self, id_, example, budget=None):
+        """
+        Index the example, returns IndexResult.
+        """
+        stats = {}
+        keys = 0
+        for hashes in self.filter_and_embellish(example, stats, budget):
             self.seed[hashes].append(id_)
+            keys += 1
+
+        reason = stats.get("reason")
+        return IndexResult(keys, reason is None, reason)
 
     def add_examples(self, examples):
-        for id_, example in examples.items():
-            self.add_example(id_, example)
+        """
+        Index examples (a dict or an iterable of id, example pairs).
+
+        Returns ids of examples which were not indexed completely (cut by
+        max_combinations or beam_combinations).
+        """
+        if isinstance(examples, dict):
+            examples = examples.items()
+
+        truncated = []
+        for id_, example in examples:
+            if not self.add_example(id_, example).complete:
+                truncated.append(id_)
+
+        return truncated
+
+    def add_examples_parallel(self, examples, processes=None, chunk_size=10000):
+        """
+        Index examples using a pool of worker processes.
+
+        Workers index chunks of examples and split their keys into disjoint
+        parts, then other workers merge each part across chunks in the order
+        of chunks. The parent only loads merged parts, so the result is the
+        same as of add_examples. Returns build stats, including ids of
+        examples which were not indexed completely.
+        """
+        started = perf_counter()
+        parts = processes or os.cpu_count() or 1
+        config = {
+            "beam_width": self.beam_width,
+            "beam_combinations": self.beam_combinations
+        }
+
+        items = list(examples.items())
+        chunks = [
+            items[i:i + chunk_size]
+            for i in range(0, len(items), chunk_size)
+        ]
+
+        # Parts have disjoint keys, so an empty index takes them as they are
+        fresh = not self.seed
+
+        with TemporaryDirectory() as tmpdir, Pool(processes) as pool:
+            truncated = pool.map(build_partial, [
+                (config, self.max_combinations, chunk_no, chunk, parts, tmpdir)
+                for chunk_no, chunk in enumerate(chunks)
+            ])
+            built = perf_counter()
+
+            for seed in pool.imap_unordered(merge_partials, [
+                    (len(chunks), part, tmpdir) for part in range(parts)]):
+                if fresh:
+                    self.seed.update(seed)
+                    continue
+
+                for hashes, ids in seed.items():
+                    self.seed[hashes].extend(ids)
+
+        elapsed = perf_counter() - started
+        return {
+            "examples": len(items),
+            "chunks": len(chunks),
+            "parts": parts,
+            "keys": len(self.seed),
+            "truncated": sum(map(len, truncated)),
+            "truncated_ids": [id_ for ids in truncated for id_ in ids],
+            "build_seconds": built - started,
+            "merge_seconds": elapsed - (built - started),
+            "seconds": elapsed,
+            "examples_per_second": len(items) / elapsed if elapsed else 0.0
+        }
+
+    def search(self, candidate, budget=None):
+        """
+        Match the candidate, returns MatchResult.
+
+        Ids are None if nothing was found, in which case complete tells
+        whether all combinations were tried.
+        """
+        stats = {}
+        for hashes in self.filter_and_embellish(candidate, stats, budget):
+            if hashes in self.seed:
+                return MatchResult(self.seed[hashes], True, None)
+
+        reason = stats.get("reason")
+        return MatchResult(None, reason is None, reason)
+
+    def match(self, candidate, budget=None):
+        """
+        Match the candidate, returns list of ids or None.
+
+        Use search to also learn whether a miss is final or the search was
+        cut short.
+        """
+        if budget is not None:
+            return self.search(candidate, budget).ids
 
-    def match(self, candidate):
         for hashes in self.filter_and_embellish(candidate):
             if hashes in self.seed:
                 return self.seed[hashes]
 
         return None
+
+    def explain(self, candidate, budget=None):
+        """
+        Match the candidate and report how much work it took.
+
+        Probes the seed exactly like match does and counts combinations
+        generated, combinations pruned (not generated at all because of beam
+        settings, limits or budget), repeated combinations among the first
+        explain_tracked ones and whether the combinations cap was reached.
+        """
+        total = 1
+        for variants in candidate:
+            total *= len(variants)
+
+        stats = {
+            "total": total,
+            "combinations": 0,
+            "pruned": 0,
+            "duplicates": 0,
+            "probes": 0,
+            "match": None
+        }
+        seen = set()
+
+        for hashes in self.filter_and_embellish(candidate, stats, budget):
+            stats["combinations"] += 1
+            if hashes in seen:
+                stats["duplicates"] += 1
+            elif len(seen) < self.explain_tracked:
+                seen.add(hashes)
+
+            stats["probes"] += 1
+            if hashes in self.seed:
+                stats["match"] = self.seed[hashes]
+                break
+
+        if stats["match"] is None:
+            stats["pruned"] = total - stats["combinations"]
+
+        reason = None if stats["match"] is not None else stats.get("reason")
+        stats["capped"] = reason == "capped"
+        stats["complete"] = reason is None
+        stats["reason"] = reason
+        return stats
@@ -1,7 +1,8 @@
-from elasticsearch_dsl import DocType, String, Object, document
+from elasticsearch_dsl import DocType, String, Float, Object, document
 from elasticsearch_dsl.query import Match
 from elasticsearch_dsl import MultiSearch
 from hashlib import sha1
+from settings import TYPO_WEIGHT
 
 
 def whitelist(dct, fields):
@@ -33,6 +34,7 @@ class NameVariant(DocType):
     term = String(
         index="not_analyzed",
     )
+    frequency = Float()
 
     properties = Object()
 
@@ -62,10 +64,19 @@ class NameVariant(DocType):
                 "lemma-lastname-typo": "lastname"
             }[labels[0]]
 
+            # Same prior as bin/convert_to_dawg.py stores in DAWG, as long
+            # as bin/import.py got the same frequencies file
+            weight = getattr(resp, "frequency", None)
+            if weight is None:
+                weight = 1.0
+            if labels[0].endswith("-typo"):
+                weight *= TYPO_WEIGHT
+
             return {
                 "term": resp.term,
                 "lemma": resp.lemma,
-                "label": label
+                "label": label,
+                "weight": weight
             }
 
         def match_req_resp(name, hashes):
@@ -1,6 +1,8 @@
 import re
 import unicodedata
-from translitua import translit, RussianInternationalPassport
+from translitua import (
+    translit, RussianInternationalPassport, UkrainianKMU,
+    UkrainianPassport2007, UkrainianPassport2004Alt, UkrainianNational1996)
 from string import capwords
 
 APOSTROPHES = "'’ʼ`\"*"  # All kind of used apostrophes, including weird ones
@@ -8,6 +10,15 @@ DASHES = "-–—‒―"  # Commonly used dashes (full list can be found here ht
 BRACKETS = "[](){}"
 YO_CHARACTER = "Ёё"
 
+# Transliteration tables most commonly seen in passports and registries
+TRANSLIT_TABLES = (
+    UkrainianKMU,
+    UkrainianPassport2007,
+    UkrainianPassport2004Alt,
+    UkrainianNational1996,
+    RussianInternationalPassport,
+)
+
 CYR_SPECIFIC_CHARSET = "а-яіїєґё"
 CYR_CHARSET = CYR_SPECIFIC_CHARSET + re.escape(APOSTROPHES) + re.escape(DASHES)
 UKR_SPECIFIC_CHARSET = "іїєґ"
@@ -327,6 +338,28 @@ def tranliterate_all_the_things(name):
     return translit(translit(name), RussianInternationalPassport)
 
 
+def transliteration_variants(term):
+    """
+    Return common latin spellings of the cyrillic term.
+
+    Variants are title-cased the same way as parse_fullname output, so they
+    can be used as lookup keys directly. Partial transliterations (russian
+    tables leave ukrainian specific letters as is) are dropped.
+    >>> sorted(transliteration_variants("Петрович"))
+    ['Petrovich', 'Petrovych']
+    >>> sorted(transliteration_variants("Юлія"))
+    ['Iuliia', 'Yuliia']
+    >>> transliteration_variants("Adam")
+    frozenset()
+    """
+    if not has_cyr(term):
+        return frozenset()
+
+    variants = map(lambda table: title(translit(term, table)),
+                   TRANSLIT_TABLES)
+    return frozenset(x for x in variants if x != term and is_eng(x))
+
+
 def normalize_alphabets(chunk):
     """
     Try to normalize names written in mixed alphabets (cyr+eng+special chars).
@@ -430,3 +463,17 @@ def parse_fullname(person_name):
     chunks = map(normalize_alphabets, chunks)
     chunks = map(title, chunks)
     return list(chunks)
+
+
+def load_frequencies(fname):
+    """
+    Read lemma frequencies from a file with "lemma<TAB>frequency" lines.
+    """
+    frequencies = {}
+    with open(fname, encoding="utf-8") as fp:
+        for line in fp:
+            if line.strip():
+                lemma, freq = line.rstrip("\n").rsplit("\t", 1)
+                frequencies[lemma] = float(freq)
+
+    return frequencies
@@ -0,0 +1,188 @@
+"""
+Unified interface to the name lookup backends.
+
+Every resolver has batch_request method that takes an array of arrays (names
+are tokenized) and returns, for every token, a tuple of variants in the
+hasher format: dicts with term, lemma and label (one of "f/p/l/u").
+Backends are imported lazily, so ES-only or DAWG-only setups work too.
+"""
+import gc
+import os.path
+import msgpack
+from matcher import dedupe_variants
+
+# Labels of NameVariant.batch_request mapped to the ones of hasher
+ES_LABELS = {
+    "firstname": "f",
+    "patronymic": "p",
+    "lastname": "l",
+    "no-match": "u",
+}
+
+
+def is_miss(variants):
+    return all(x["label"] == "u" for x in variants)
+
+
+def freeze_long_lived():
+    """
+    Move all objects alive now to the permanent GC generation.
+
+    Garbage collector won't rescan long-lived structures (Matcher index
+    first of all) anymore, which keeps collections triggered by big batches
+    short. It affects the whole process, so call it from the entry point of
+    the service once backends and the index are loaded, not from a library.
+    Unlike gc.disable() it's safe to use with concurrent callers.
+    """
+    if hasattr(gc, "freeze"):
+        gc.collect()
+        gc.freeze()
+
+
+class DawgResolver(object):
+    """
+    Resolve tokens against in-memory DAWG (see hasher.py).
+    """
+
+    def __init__(self):
+        # Load DAWG upfront rather than on the first request
+        import hasher  # noqa
+
+    def batch_request(self, names):
+        from hasher import batch_request
+
+        return batch_request(names)
+
+
+def load_lemma_dict(fname):
+    with open(fname, "rb") as fp:
+        lemmas = msgpack.load(fp)
+
+    return {
+        k.decode("utf-8") if isinstance(k, bytes) else k: v
+        for k, v in lemmas.items()
+    }
+
+
+class ElasticResolver(object):
+    """
+    Resolve tokens against Elasticsearch (see models/names.py).
+
+    Lemmas are translated to the ids DAWG uses (from lemma_dict.mpack written
+    by bin/convert_to_dawg.py), so results of both backends can be matched
+    against each other. Lemmas unknown to DAWG are kept as is. Connection
+    must be configured by the caller.
+    """
+
+    def __init__(self, lemma_dict=None):
+        if lemma_dict is None:
+            lemma_dict = os.path.join(
+                os.path.dirname(__file__), "lemma_dict.mpack")
+
+        self.lemmas = {}
+        if os.path.exists(lemma_dict):
+            self.lemmas = load_lemma_dict(lemma_dict)
+
+    def normalize(self, variant):
+        return dict(
+            variant,
+            label=ES_LABELS[variant["label"]],
+            lemma=self.lemmas.get(variant["lemma"], variant["lemma"]),
+            weight=variant.get("weight", 1.0)
+        )
+
+    def batch_request(self, names):
+        from models.names import NameVariant
+
+        if not any(names):
+            return [tuple(() for _ in name) for name in names]
+
+        return [
+            tuple(
+                dedupe_variants(map(self.normalize, variants))
+                for variants in name
+            )
+            for name in NameVariant.batch_request(names)
+        ]
+
+
+class TieredResolver(object):
+    """
+    Resolve tokens with the primary backend first and send only tokens it
+    couldn't resolve to the fallback backend, in one batched request.
+    """
+
+    def __init__(self, primary=None, fallback=None):
+        self.primary = primary if primary is not None else DawgResolver()
+        self.fallback = fallback if fallback is not None else ElasticResolver()
+
+    def batch_request(self, names):
+        results = self.primary.batch_request(names)
+
+        misses = sorted(set(
+            chunk
+            for name, res in zip(names, results)
+            for chunk, variants in zip(name, res)
+            if is_miss(variants)
+        ))
+
+        if not misses:
+            return results
+
+        resolved = dict(zip(misses, self.fallback.batch_request([misses])[0]))
+
+        return [
+            tuple(
+                resolved[chunk] if is_miss(variants) else variants
+                for chunk, variants in zip(name, res)
+            )
+            for name, res in zip(names, results)
+        ]
+
+
+class ConcurrentResolver(object):
+    """
+    Split a large batch into chunks and resolve them on an executor.
+
+    Executor is any concurrent.futures executor. DAWG lookups are CPU-bound
+    and hold the GIL, so they only scale on a process pool, where every
+    worker imports hasher and loads its own copy of DAWG (shared with the
+    parent only when processes are forked after hasher is imported). Thread
+    pool suits Elasticsearch and tiered backends, which mostly wait on the
+    network. Results keep the order of names. Without executor the batch is
+    resolved in the calling thread.
+
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> class Upper(object):
+    ...     def batch_request(self, names):
+    ...         return [tuple(x.upper() for x in name) for name in names]
+    >>> names = [["a", "b"], ["c"], ["d", "e"], ["f"], ["g"]]
+    >>> with ThreadPoolExecutor(3) as executor:
+    ...     resolver = ConcurrentResolver(Upper(), executor, chunk_size=2)
+    ...     res = resolver.batch_request(names)
+    >>> res == Upper().batch_request(names)
+    True
+    >>> res
+    [('A', 'B'), ('C',), ('D', 'E'), ('F',), ('G',)]
+    """
+
+    def __init__(self, backend=None, executor=None, chunk_size=1000):
+        self.backend = backend if backend is not None else DawgResolver()
+        self.executor = executor
+        self.chunk_size = chunk_size
+
+    def batch_request(self, names):
+        names = list(names)
+        chunks = [
+            names[i:i + self.chunk_size]
+            for i in range(0, len(names), self.chunk_size)
+        ]
+
+        if self.executor is None or len(chunks) < 2:
+            return self.backend.batch_request(names)
+
+        results = []
+        for res in self.executor.map(self.backend.batch_request, chunks):
+            results.extend(res)
+
+        return results
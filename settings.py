@@ -5,3 +5,6 @@ ELASTICSEARCH_CONNECTIONS = {
         'timeout': 20
     }
 }
+
+# Prior weight multiplier for typo variants of the term
+TYPO_WEIGHT = 0.5